@@ -114,9 +114,11 @@ def init_command(prefix, toolchain, cc, cxx, cflags, cxxflags, ldflags, std, def
 @click.option('--release', is_flag=True, help="Install release version")
 @click.option('--build-type', help="Install custom version [Release, Debug, RelWithDebInfo or other cmake build type]")
 @click.option('--insecure', is_flag=True, help="Don't use https urls")
+@click.option('-j', '--jobs', type=int, default=min(8, os.cpu_count() or 1), envvar='CGET_JOBS',
+              help="Number of dependencies to fetch in parallel")
 @click.argument('pkgs', nargs=-1, type=click.STRING)
 def install_command(prefix, pkgs, define, file, test, test_all, update, generator, cmake, debug, release, build_type,
-                    insecure):
+                    insecure, jobs):
     """ Install packages """
     variant = get_build_type(debug, release, build_type)
     if not file and not pkgs:
@@ -128,7 +130,8 @@ def install_command(prefix, pkgs, define, file, test, test_all, update, generato
         pb = pbu.merge_defines(define)
         pb.variant = variant
         with prefix.try_("Failed to build package {}".format(pb.to_name()), on_fail=lambda: prefix.remove(pb)):
-            display.console.print(prefix.install(pb, test=test, test_all=test_all, update=update, generator=generator, insecure=insecure))
+            display.console.print(prefix.install(pb, test=test, test_all=test_all, update=update, generator=generator,
+                                                 insecure=insecure, jobs=jobs))
 
 @cli.command(name='ignore')
 @use_prefix
@@ -1,7 +1,8 @@
-import os, shutil, shlex, six, inspect, contextlib, sys, functools, hashlib
-import platform
+import os, shutil, shlex, six, contextlib, sys, functools, hashlib, copy, itertools
+import platform, threading
+import concurrent.futures
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from cget.builder import Builder
 from cget.package import fname_to_pkg
@@ -15,25 +16,35 @@ from cget.types import params
 
 __CGET_DIR__ = os.path.dirname(os.path.realpath(__file__))
 __CGET_CMAKE_DIR__ = os.path.join(__CGET_DIR__, 'cmake')
+__CGET_CMAKE_FILES__ = frozenset(os.listdir(__CGET_CMAKE_DIR__)) if os.path.isdir(__CGET_CMAKE_DIR__) else frozenset()
 
-def find_requirements_file(directory, name='requirements'):
-    cget_file = os.path.join(directory, name + '.cget')
-    if os.path.exists(cget_file):
+def find_requirements_file(directory, name='requirements') -> Optional[Path]:
+    cget_file = Path(directory) / (name + '.cget')
+    if cget_file.exists():
         return cget_file
-    txt_file = os.path.join(directory, name + '.txt')
-    if os.path.exists(txt_file):
+    txt_file = cget_file.with_suffix('.txt')
+    if txt_file.exists():
         display.warning("Using '{}' is deprecated. Rename to '{}'.".format(name + '.txt', name + '.cget'))
         return txt_file
     return None
 
+def split_tokens(line):
+    # Only quotes, escapes and comments need shlex, most lines are plain words
+    if '"' in line or "'" in line or '\\' in line or '#' in line:
+        return shlex.split(line, comments=True)
+    return line.split()
+
+
 @params(s=six.string_types)
 def parse_deprecated_alias(s):
-    i = s.find(':', 0, max(s.find('://'), s.find(':\\')))
+    i = s.find(':')
     if i > 0:
-        display.warning("Using ':' for aliases is now deprecated.")
-        return s[0:i], s[i + 1:]
-    else:
-        return None, s
+        # The separator must come before any '://' or ':\\', which can only start at i or later
+        end = max(s.find('://', i), s.find(':\\', i))
+        if i < end or (end < 0 and i < len(s) - 1):
+            display.warning("Using ':' for aliases is now deprecated.")
+            return s[0:i], s[i + 1:]
+    return None, s
 
 
 @params(s=six.string_types)
@@ -52,7 +63,7 @@ def parse_src_name(url, default=None):
     # If the same name is used, then reduce to the same name
     if '/' in p:
         ps = p.split('/')
-        if functools.reduce(lambda x, y: x == y, ps):
+        if all(x == ps[0] for x in ps):
             p = ps[0]
     v = default
     if len(x) > 1: v = x[1]
@@ -65,70 +76,127 @@ def cmake_set(var, val, quote=True, cache=None, description=None):
     if quote:
         val = util.quote(val)
     if cache is None or cache.lower() == 'none':
-        yield f'set({var} {val})'
+        return f'set({var} {val})'
     else:
-        yield f'set({var} {val} CACHE {cache} "{description or ""}")'
+        return f'set({var} {val} CACHE {cache} "{description or ""}")'
 
 
 def cmake_append(var, *vals, **kwargs):
     quote = True
     if 'quote' in kwargs:
         quote = kwargs['quote']
-    x = ' '.join([str(v) for v in vals])
-    if quote:
-        x = ' '.join([util.quote(val) for val in vals])
-    yield f'list(APPEND {var} {x})'
+    x = ' '.join([util.quote(v) if quote else str(v) for v in vals])
+    return f'list(APPEND {var} {x})'
 
 
-def cmake_if(cond, *args):
-    yield 'if ({})'.format(cond)
+def cmake_indent(lines, *args):
     for arg in args:
-        for line in arg:
-            yield '    ' + line
-    yield 'endif()'
+        lines.extend(['    ' + line for line in util.as_list(arg)])
+    return lines
+
+
+def cmake_if(cond, *args):
+    lines = cmake_indent(['if ({})'.format(cond)], *args)
+    lines.append('endif()')
+    return lines
 
 
 def cmake_else(*args):
-    yield 'else ()'
-    for arg in args:
-        for line in arg:
-            yield '    ' + line
+    return cmake_indent(['else ()'], *args)
+
+
+CMAKE_BOOL_VALUES = frozenset(['on', 'off', 'true', 'false'])
 
 
 def parse_cmake_var_type(key, value):
     if ':' in key:
         p = key.split(':')
         return (p[0], p[1].upper(), value)
-    elif value.lower() in ['on', 'off', 'true', 'false']:
+    elif value.lower() in CMAKE_BOOL_VALUES:
         return (key, 'BOOL', value)
     else:
         return (key, 'STRING', value)
 
 
-def find_cmake(p, start):
+def as_hashable(x):
+    if isinstance(x, dict):
+        return tuple((k, as_hashable(v)) for k, v in x.items())
+    if isinstance(x, (list, tuple)):
+        return tuple(as_hashable(v) for v in x)
+    return x
+
+
+def find_cmake(p, start, exists=os.path.exists):
     if p and not os.path.isabs(p):
         absp = util.actual_path(p, start)
-        if os.path.exists(absp):
+        if exists(absp):
             return absp
         else:
-            x = util.cget_dir('cmake', p)
-            if os.path.exists(x):
-                return x
-            elif os.path.exists(x + '.cmake'):
-                return x + '.cmake'
+            if p in __CGET_CMAKE_FILES__:
+                return os.path.join(__CGET_CMAKE_DIR__, p)
+            elif p + '.cmake' in __CGET_CMAKE_FILES__:
+                return os.path.join(__CGET_CMAKE_DIR__, p + '.cmake')
     return p
 
 
 PACKAGE_SOURCE_TYPES = (six.string_types, PackageSource, PackageBuild)
 
 
+class InstallPlan(contextlib.ExitStack):
+    def __init__(self, jobs=1):
+        super().__init__()
+        self.jobs = jobs
+        self.lock = threading.Lock()
+        # Each package plans its dependencies in its own pool, so bound the fetches across all of them
+        self.fetching = threading.Semaphore(max(1, jobs))
+        # Builders of packages that haven't been installed yet
+        self.pending = []
+        # Packages to record as a dependency of their parent once the builders are closed
+        self.parents = []
+        self.reset()
+
+    def reset(self):
+        # File names of the packages planned so far
+        self.planned = set()
+        # Packages to build and the file names of their dependencies, by file name
+        self.steps = {}
+
+    def claim(self, fname):
+        # Only the first package with this name gets planned, which also ends dependency cycles
+        with self.lock:
+            if fname in self.planned:
+                return False
+            self.planned.add(fname)
+            return True
+
+    def ordered_steps(self):
+        # Dependencies are planned in parallel, so walk them from the package
+        # planned last (the one asked for) to build each after its dependencies
+        result = []
+        visited = set()
+
+        def visit(fname):
+            if fname in visited or fname not in self.steps:
+                return
+            visited.add(fname)
+            requires, step = self.steps[fname]
+            for r in requires: visit(r)
+            result.append(step)
+
+        for fname in reversed(list(self.steps)): visit(fname)
+        return result
+
+
 class CGetPrefix:
     def __init__(self, prefix, verbose=False, build_path=None):
         self.prefix = Path(prefix or 'cget').absolute()
         self.verbose = verbose
         self.build_path = build_path
-        self.cmd = util.Commander(paths=[self.prefix / 'bin'], env=self.get_env(), verbose=self.verbose)
-        self.toolchain = self.write_cmake()
+        self._pkg_src_cache = {}
+        self._exists_cache = {}
+        self._recipe_cache = {}
+        self._toolchain_cache = {}
+        self._recipe_paths = [self.get_public_path() / 'recipes']
 
     def log(self, *args):
         if self.verbose: display.verbose(' '.join([str(arg) for arg in args]))
@@ -137,71 +205,100 @@ class CGetPrefix:
         if self.verbose and not f(*args):
             raise util.BuildError('ASSERTION FAILURE: ', ' '.join([str(arg) for arg in args]))
 
-    def get_env(self):
+    @util.cached_property
+    def cmd(self):
+        return util.Commander(paths=[self.prefix / 'bin'], env=self.env, verbose=self.verbose)
+
+    @util.cached_property
+    def env(self):
         if os.name == 'nt':
             return None
         return {
             'LD_LIBRARY_PATH': str(self.prefix / 'lib'),
-            'PKG_CONFIG_PATH': self.pkg_config_path()
+            'PKG_CONFIG_PATH': self.pkg_config_path
         }
 
+    @util.cached_property
+    def toolchain(self) -> Path:
+        return self.write_cmake()
 
     def write_cmake(self, always_write=False, **kwargs):
-        return util.mkfile(self.get_private_path(), 'cget.cmake', self.generate_cmake_toolchain(**kwargs),
-                           always_write=always_write)
-
-    @returns(inspect.isgenerator)
-    @util.yield_from
+        d = self.get_private_path()
+        toolchain = d / 'cget.cmake'
+        if toolchain.exists() and not always_write:
+            return toolchain
+        lines = self.generate_cmake_toolchain(**kwargs)
+        # Leave the file untouched when the content is the same, so its mtime
+        # doesn't trigger a reconfigure of projects using it
+        if toolchain.exists():
+            h = hashlib.sha1(''.join(line + '\n' for line in lines).encode('utf-8')).hexdigest()
+            if util.hash_file(toolchain, 'sha1') == h:
+                return toolchain
+        return util.mkfile(d, 'cget.cmake', lines, always_write=True)
+
+    @returns(list)
     def generate_cmake_toolchain(self, toolchain=None, cc=None, cxx=None, cflags=None, cxxflags=None, ldflags=None,
                                  std=None, defines=None):
+        key = as_hashable((toolchain, cc, cxx, cflags, cxxflags, ldflags, std, defines or {}))
+        lines = self._toolchain_cache.get(key)
+        if lines is None:
+            lines = self._toolchain_cache[key] = tuple(self._generate_cmake_toolchain(
+                toolchain=toolchain, cc=cc, cxx=cxx, cflags=cflags, cxxflags=cxxflags, ldflags=ldflags, std=std,
+                defines=defines))
+        return list(lines)
+
+    def _generate_cmake_toolchain(self, toolchain=None, cc=None, cxx=None, cflags=None, cxxflags=None, ldflags=None,
+                                  std=None, defines=None):
         set_ = cmake_set
         if_ = cmake_if
         else_ = cmake_else
         append_ = cmake_append
-        yield set_('CGET_PREFIX', self.prefix)
-        yield set_('CMAKE_PREFIX_PATH', self.prefix)
-        yield if_('${CMAKE_VERSION} VERSION_LESS "3.6.0"',
-                  ['include_directories(SYSTEM ${CGET_PREFIX}/include)'],
-                  else_(
-                      set_('CMAKE_CXX_STANDARD_INCLUDE_DIRECTORIES', '${CGET_PREFIX}/include'),
-                      set_('CMAKE_C_STANDARD_INCLUDE_DIRECTORIES', '${CGET_PREFIX}/include')
-                  )
-                  )
-        if toolchain: yield ['include({})'.format(util.quote(os.path.abspath(toolchain)))]
-        yield if_('CMAKE_CROSSCOMPILING',
-                  append_('CMAKE_FIND_ROOT_PATH', self.prefix)
-                  )
-        yield if_('CMAKE_INSTALL_PREFIX_INITIALIZED_TO_DEFAULT',
-                  set_('CMAKE_INSTALL_PREFIX', self.prefix)
-                  )
-        if cxx: yield set_('CMAKE_CXX_COMPILER', cxx)
-        if cc: yield set_('CMAKE_C_COMPILER', cc)
+        lines = []
+        lines.append(set_('CGET_PREFIX', self.prefix))
+        lines.append(set_('CMAKE_PREFIX_PATH', self.prefix))
+        lines.extend(if_('${CMAKE_VERSION} VERSION_LESS "3.6.0"',
+                         'include_directories(SYSTEM ${CGET_PREFIX}/include)',
+                         else_(
+                             set_('CMAKE_CXX_STANDARD_INCLUDE_DIRECTORIES', '${CGET_PREFIX}/include'),
+                             set_('CMAKE_C_STANDARD_INCLUDE_DIRECTORIES', '${CGET_PREFIX}/include')
+                         )
+                         ))
+        if toolchain: lines.append('include({})'.format(util.quote(os.path.abspath(toolchain))))
+        lines.extend(if_('CMAKE_CROSSCOMPILING',
+                         append_('CMAKE_FIND_ROOT_PATH', self.prefix)
+                         ))
+        lines.extend(if_('CMAKE_INSTALL_PREFIX_INITIALIZED_TO_DEFAULT',
+                         set_('CMAKE_INSTALL_PREFIX', self.prefix)
+                         ))
+        if cxx: lines.append(set_('CMAKE_CXX_COMPILER', cxx))
+        if cc: lines.append(set_('CMAKE_C_COMPILER', cc))
         if std:
-            yield if_('NOT "${CMAKE_CXX_COMPILER_ID}" STREQUAL "MSVC"',
-                      set_('CMAKE_CXX_STD_FLAG', "-std={}".format(std))
-                      )
-        yield if_('"${CMAKE_CXX_COMPILER_ID}" STREQUAL "MSVC"',
-                  set_('CMAKE_CXX_ENABLE_PARALLEL_BUILD_FLAG', "/MP")
-                  )
+            lines.extend(if_('NOT "${CMAKE_CXX_COMPILER_ID}" STREQUAL "MSVC"',
+                             set_('CMAKE_CXX_STD_FLAG', "-std={}".format(std))
+                             ))
+        lines.extend(if_('"${CMAKE_CXX_COMPILER_ID}" STREQUAL "MSVC"',
+                         set_('CMAKE_CXX_ENABLE_PARALLEL_BUILD_FLAG', "/MP")
+                         ))
         if cflags:
-            yield set_('CMAKE_C_FLAGS', "$ENV{{CFLAGS}} ${{CMAKE_C_FLAGS_INIT}} {}".format(cflags or ''),
-                       cache='STRING')
+            lines.append(set_('CMAKE_C_FLAGS', "$ENV{{CFLAGS}} ${{CMAKE_C_FLAGS_INIT}} {}".format(cflags or ''),
+                              cache='STRING'))
         if cxxflags or std:
-            yield set_('CMAKE_CXX_FLAGS',
-                       "$ENV{{CXXFLAGS}} ${{CMAKE_CXX_FLAGS_INIT}} ${{CMAKE_CXX_STD_FLAG}} {}".format(cxxflags or ''),
-                       cache='STRING')
+            lines.append(set_('CMAKE_CXX_FLAGS',
+                              "$ENV{{CXXFLAGS}} ${{CMAKE_CXX_FLAGS_INIT}} ${{CMAKE_CXX_STD_FLAG}} {}".format(cxxflags or ''),
+                              cache='STRING'))
         if ldflags:
             for link_type in ['STATIC', 'SHARED', 'MODULE', 'EXE']:
-                yield set_('CMAKE_{}_LINKER_FLAGS'.format(link_type), "$ENV{{LDFLAGS}} {0}".format(ldflags),
-                           cache='STRING')
+                lines.append(set_('CMAKE_{}_LINKER_FLAGS'.format(link_type), "$ENV{{LDFLAGS}} {0}".format(ldflags),
+                                  cache='STRING'))
         for dkey in defines or {}:
             name, vtype, value = parse_cmake_var_type(dkey, defines[dkey])
-            yield set_(name, value, cache=vtype, quote=(vtype != 'BOOL'))
-        yield if_('BUILD_SHARED_LIBS',
-                  set_('CMAKE_WINDOWS_EXPORT_ALL_SYMBOLS', 'ON', cache='BOOL')
-                  )
-        yield set_('CMAKE_FIND_FRAMEWORK', 'LAST', cache='STRING')
-        yield set_('CMAKE_INSTALL_RPATH', '${CGET_PREFIX}/lib', cache='STRING')
+            lines.append(set_(name, value, cache=vtype, quote=(vtype != 'BOOL')))
+        lines.extend(if_('BUILD_SHARED_LIBS',
+                         set_('CMAKE_WINDOWS_EXPORT_ALL_SYMBOLS', 'ON', cache='BOOL')
+                         ))
+        lines.append(set_('CMAKE_FIND_FRAMEWORK', 'LAST', cache='STRING'))
+        lines.append(set_('CMAKE_INSTALL_RPATH', '${CGET_PREFIX}/lib', cache='STRING'))
+        return lines
 
     def get_private_path(self) -> Path:
         return self.prefix / 'cget'
@@ -210,7 +307,18 @@ class CGetPrefix:
         return self.prefix / 'etc' / 'cget'
 
     def get_recipe_paths(self) -> List[Path]:
-        return [self.get_public_path() / 'recipes']
+        return self._recipe_paths
+
+    def _exists(self, p):
+        p = os.path.abspath(p)
+        result = self._exists_cache.get(p)
+        if result is None:
+            result = self._exists_cache[p] = os.path.exists(p)
+        return result
+
+    def _clear_caches(self):
+        self._pkg_src_cache.clear()
+        self._exists_cache.clear()
 
     @contextlib.contextmanager
     @params(pb=PACKAGE_SOURCE_TYPES)
@@ -224,7 +332,10 @@ class CGetPrefix:
 
     @params(pb=PACKAGE_SOURCE_TYPES)
     def get_package_directory(self, pb):
-        pb = self.parse_pkg_build(pb)
+        return self._get_package_directory_raw(self.parse_pkg_build(pb))
+
+    def _get_package_directory_raw(self, pb):
+        # For a package that has already been parsed
         return self.get_private_path() / pb.to_fname()
 
     @params(pb=PACKAGE_SOURCE_TYPES)
@@ -238,14 +349,14 @@ class CGetPrefix:
     def parse_src_file(self, name, url, start=None):
         f = util.actual_path(url, start)
         self.log('parse_src_file actual_path:', start, f)
-        if os.path.exists(f): return PackageSource(name=name, url='file://' + f)
+        if self._exists(f): return PackageSource(name=name, url='file://' + f)
         return None
 
     def parse_src_recipe(self, name, url):
         p, v = parse_src_name(url)
         for rpath in self.get_recipe_paths():
             rp = os.path.normcase(os.path.join(rpath, p, v or ''))
-            if os.path.exists(rp):
+            if self._exists(rp):
                 return PackageSource(name=name or p, recipe=rp)
         return None
 
@@ -265,6 +376,14 @@ class CGetPrefix:
             return pkg
         if isinstance(pkg, PackageBuild):
             return self.parse_pkg_src(pkg.pkg_src, start)
+        key = (pkg, start, no_recipe)
+        pkg_src = self._pkg_src_cache.get(key)
+        if pkg_src is None:
+            pkg_src = self._pkg_src_cache[key] = self._parse_pkg_src(pkg, start, no_recipe)
+        # Callers may rename the source, so never hand out the cached one
+        return copy.copy(pkg_src)
+
+    def _parse_pkg_src(self, pkg, start=None, no_recipe=False):
         name, url = parse_alias(pkg)
         self.log('parse_pkg_src:', name, url, pkg)
         if '://' not in url:
@@ -279,7 +398,7 @@ class CGetPrefix:
         if isinstance(pkg, PackageBuild):
             pkg.pkg_src = self.parse_pkg_src(pkg.pkg_src, start, no_recipe)
             if pkg.pkg_src.recipe: pkg = self.from_recipe(pkg.pkg_src.recipe, pkg)
-            if pkg.cmake: pkg.cmake = find_cmake(pkg.cmake, start)
+            if pkg.cmake: pkg.cmake = find_cmake(pkg.cmake, start, exists=self._exists)
             return pkg
         else:
             pkg_src = self.parse_pkg_src(pkg, start, no_recipe)
@@ -291,11 +410,17 @@ class CGetPrefix:
     def from_recipe(self, recipe, pkg=None, name=None):
         recipe_pkg = os.path.join(recipe, "package.txt")
         util.ensure_exists(recipe_pkg)
-        p = next(iter(self.from_file(recipe_pkg, no_recipe=True)))
-        self.check(lambda:p.pkg_src is not None)
-        requirements = find_requirements_file(recipe)
-        if requirements is not None: p.requirements = requirements
-        p.pkg_src.recipe = None
+        mtime = os.path.getmtime(recipe_pkg)
+        cached = self._recipe_cache.get(recipe)
+        if cached is None or cached[0] != mtime:
+            p = next(iter(self.from_file(recipe_pkg, no_recipe=True)))
+            self.check(lambda:p.pkg_src is not None)
+            requirements = find_requirements_file(recipe)
+            if requirements is not None: p.requirements = requirements
+            p.pkg_src.recipe = None
+            cached = self._recipe_cache[recipe] = (mtime, p)
+        # The build is renamed and merged below, so never hand out the cached one
+        p = copy.deepcopy(cached[1])
         # Use original name
         if pkg:
             p.pkg_src.name = pkg.pkg_src.name
@@ -310,16 +435,16 @@ class CGetPrefix:
     def from_file(self, file, url=None, no_recipe=False):
         if file is None:
             return
-        if not os.path.exists(file):
-            self.log("file not found: " + file)
+        if not self._exists(file):
+            self.log("file not found:", file)
             return
         start = os.path.dirname(file)
         if url is not None and url.startswith('file://'):
             start = url[7:]
         with open(file) as f:
-            self.log("parse file: " + file)
-            for line in f.readlines():
-                tokens = shlex.split(line, comments=True)
+            self.log("parse file:", file)
+            for line in f:
+                tokens = split_tokens(line)
                 if len(tokens) > 0:
                     pb = parse_pkg_build_tokens(tokens)
                     ps = self.from_file(util.actual_path(pb.file, start), no_recipe=no_recipe) if pb.file else [
@@ -327,24 +452,90 @@ class CGetPrefix:
                     for p in ps: yield p
 
     def write_parent(self, pb, track=True):
-        if track and pb.parent is not None: util.mkfile(self.get_deps_directory(pb.to_fname()), pb.parent, pb.parent)
+        if track and pb.parent is not None:
+            util.mkfile(self.get_deps_directory(pb.to_fname()), pb.parent, pb.parent)
 
-    def install_deps(self, pb, d, test=False, test_all=False, generator=None, insecure=False,
-                     ignore_requirements=False):
+    def _dependents(self, pb, d, test=False, test_all=False, ignore_requirements=False):
         req_txt = find_requirements_file(d) if not ignore_requirements else None
+        testing = test or test_all
         for dependent in self.from_file(pb.requirements or req_txt, pb.pkg_src.url):
-            transient = dependent.test or dependent.build
-            testing = test or test_all
-            installable = not dependent.test or dependent.test == testing
-            if installable:
-                self.install(dependent.of(pb), test_all=test_all, generator=generator, track=not transient,
-                             insecure=insecure)
+            if not dependent.test or dependent.test == testing:
+                yield dependent.of(pb), not (dependent.test or dependent.build)
+
+    def _run_all(self, fs, jobs=1):
+        if jobs > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                futures = [executor.submit(f) for f in fs]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        future.result()
+                except:
+                    for future in futures: future.cancel()
+                    raise
+        else:
+            for f in fs: f()
+
+    def install_deps(self, pb, d, test=False, test_all=False, generator=None, insecure=False,
+                     ignore_requirements=False):
+        for dependent, track in self._dependents(pb, d, test=test, test_all=test_all,
+                                                 ignore_requirements=ignore_requirements):
+            self.install(dependent, test_all=test_all, generator=generator, track=track, insecure=insecure)
 
     @returns(six.string_types)
-    @params(pb=PACKAGE_SOURCE_TYPES, test=bool, test_all=bool, update=bool, track=bool)
-    def install(self, pb, test=False, test_all=False, generator=None, update=False, track=True, insecure=False):
+    @params(pb=PACKAGE_SOURCE_TYPES, test=bool, test_all=bool, update=bool, track=bool, jobs=int)
+    def install(self, pb, test=False, test_all=False, generator=None, update=False, track=True, insecure=False,
+                jobs=1):
+        return self._install(pb, generator=generator, test=test, test_all=test_all, update=update, track=track,
+                             insecure=insecure, jobs=jobs)
+
+    def _install(self, pb, generator=None, jobs=1, **kwargs):
+        plan = InstallPlan(jobs)
+        try:
+            with plan:
+                try:
+                    result = self._plan(pb, plan, **kwargs)
+                    # Recipes installed by a package change what the names still to
+                    # be built resolve to, so plan those again
+                    while not self._execute(plan, generator=generator):
+                        self._discard_pending(plan)
+                        plan.reset()
+                        result = self._plan(pb, plan, **kwargs)
+                except:
+                    self._discard_pending(plan)
+                    raise
+        finally:
+            # Closing a builder removes its directory, so only record parents afterwards
+            for dependent, dependent_track in plan.parents:
+                self.write_parent(dependent, track=dependent_track)
+        return result
+
+    def _discard_pending(self, plan):
+        # Packages that were fetched but not built must not look installed
+        unbuilt = set(builder.top_dir for builder in plan.pending)
+        for d in unbuilt:
+            shutil.rmtree(d, ignore_errors=True)
+        plan.parents = [(pb, track) for pb, track in plan.parents
+                        if self._get_package_directory_raw(pb) not in unbuilt]
+        plan.pending = []
+
+    def _plan(self, pb, plan, test=False, test_all=False, update=False, track=True, insecure=False):
+        pkg_src = self.parse_pkg_src(pb)
+        if isinstance(pb, PackageBuild):
+            pb.pkg_src = pkg_src
+        fname = pkg_src.to_fname()
+        # Dependencies shared by packages planned in parallel must only be fetched once
+        if not plan.claim(fname):
+            plan.parents.append((pb, track))
+            return "[yellow]![/] Package {} already installed".format(display.pkg(pb.to_name()))
+        if isinstance(pb, PackageBuild) and not update:
+            # The source is enough to locate the package, so skip parsing its
+            # recipe when it is already installed
+            pkg_dir = self._get_package_directory_raw(pb)
+            if pkg_dir.is_dir() and not (pkg_dir / 'unlink').is_dir():
+                plan.parents.append((pb, track))
+                return "[yellow]![/] Package {} already installed".format(display.pkg(pb.to_name()))
         pb = self.parse_pkg_build(pb)
-        pkg_dir = self.get_package_directory(pb)
+        pkg_dir = self._get_package_directory_raw(pb)
         unlink_dir = pkg_dir / 'unlink'
         # If it's been unlinked, then link it in
         if unlink_dir.is_dir():
@@ -352,42 +543,65 @@ class CGetPrefix:
                 shutil.rmtree(unlink_dir)
             else:
                 self.link(pb)
-                self.write_parent(pb, track=track)
+                plan.parents.append((pb, track))
                 return "[green]\u2713[/] Linking package {}".format(display.pkg(pb.to_name()))
         if pkg_dir.is_dir():
-            self.write_parent(pb, track=track)
+            plan.parents.append((pb, track))
             if update:
                 self.remove(pb)
             else:
-            	return "[yellow]![/] Package {} already installed".format(display.pkg(pb.to_name()))
-        with self.create_builder(pb, tmp=True) as builder:
-            # Fetch package
-            src_dir = builder.fetch(pb.pkg_src.url, pb.hash, (pb.cmake != None), insecure=insecure)
-            # Install any dependencies first
-            self.install_deps(pb, src_dir, test=test, test_all=test_all, generator=generator, insecure=insecure,
-                              ignore_requirements=pb.ignore_requirements)
-            # Setup cmake file
-            if pb.cmake:
-                target = os.path.join(src_dir, 'CMakeLists.txt')
-                if os.path.exists(target):
-                    os.rename(target, os.path.join(src_dir, builder.cmake_original_file))
-                shutil.copyfile(pb.cmake, target)
+                return "[yellow]![/] Package {} already installed".format(display.pkg(pb.to_name()))
+        builder = plan.enter_context(self.create_builder(pb, tmp=True))
+        plan.pending.append(builder)
+        # Fetch package
+        with plan.fetching:
+            src_dir = Path(builder.fetch(pb.pkg_src.url, pb.hash, (pb.cmake != None), insecure=insecure))
+        # Plan any dependencies, which are built before this package
+        dependents = list(self._dependents(pb, src_dir, test=test, test_all=test_all,
+                                           ignore_requirements=pb.ignore_requirements))
+        self._run_all((functools.partial(self._plan, dependent, plan, test_all=test_all, track=track,
+                                         insecure=insecure)
+                       for dependent, track in dependents), jobs=plan.jobs)
+        # Setup cmake file
+        if pb.cmake:
+            target = src_dir / 'CMakeLists.txt'
+            if target.exists():
+                target.rename(src_dir / builder.cmake_original_file)
+            shutil.copyfile(pb.cmake, target)
+        requires = [self.parse_pkg_src(dependent).to_fname() for dependent, _ in dependents]
+        plan.steps[fname] = (requires, (pb, builder, src_dir, test, test or test_all, track))
+        return "[green]\u2713[/] Successfully installed {}".format(display.pkg(pb.to_name()))
+
+    def _recipe_dirs(self):
+        return set(d for rpath in self.get_recipe_paths() for d, _, _ in os.walk(rpath))
+
+    def _execute(self, plan, generator=None):
+        # Returns False if recipes were installed before all the steps were built
+        recipes = self._recipe_dirs()
+        steps = plan.ordered_steps()
+        for i, (pb, builder, src_dir, test, run_tests, track) in enumerate(steps):
+            display.info("Building {}".format(display.pkg(pb.to_name())))
             # Configure and build
             builder.configure(src_dir, defines=pb.define, generator=generator, install_prefix=self.prefix, test=test,
                               variant=pb.variant)
             builder.build(variant=pb.variant)
             # Run tests if enabled
-            if test or test_all: builder.test(variant=pb.variant)
+            if run_tests: builder.test(variant=pb.variant)
             # Install
             builder.build(target='install', variant=pb.variant)
-        self.write_parent(pb, track=track)
-        return "[green]\u2713[/] Successfully installed {}".format(display.pkg(pb.to_name()))
+            plan.pending.remove(builder)
+            plan.parents.append((pb, track))
+            # The package may have installed recipes, which changes how names resolve
+            self._clear_caches()
+            if i + 1 < len(steps) and self._recipe_dirs() != recipes:
+                return False
+        return True
 
     @returns(six.string_types)
     @params(pb=PACKAGE_SOURCE_TYPES)
     def ignore(self, pb):
         pb = self.parse_pkg_build(pb)
-        pkg_dir = self.get_private_path() / pb.to_fname()
+        pkg_dir = self._get_package_directory_raw(pb)
         # If package doesn't exist
         if not pkg_dir.exists():
             util.mkfile(pkg_dir, "ignore", "ignore")
@@ -428,6 +642,7 @@ class CGetPrefix:
         p = self.get_package_directory(pb)
         if p.exists():
             shutil.rmtree(p)
+            self._clear_caches()
 
     @params(pb=PACKAGE_SOURCE_TYPES)
     def build_configure(self, pb):
@@ -445,7 +660,7 @@ class CGetPrefix:
     @params(pkg=PACKAGE_SOURCE_TYPES)
     def unlink(self, pkg, delete=False):
         pkg = self.parse_pkg_src(pkg)
-        pkg_dir = self.get_package_directory(pkg)
+        pkg_dir = self._get_package_directory_raw(pkg)
         unlink_dir = self.get_unlink_directory(pkg)
         self.log("Unlink:", pkg_dir)
         if pkg_dir.exists():
@@ -454,6 +669,7 @@ class CGetPrefix:
             else:
                 util.rm_dup_dir(pkg_dir / 'install', self.prefix, remove_both=False)
             util.rm_empty_dirs(self.prefix)
+            self._clear_caches()
             if delete:
                 util.delete_dir(pkg_dir)
             else:
@@ -463,9 +679,9 @@ class CGetPrefix:
     @params(pkg=PACKAGE_SOURCE_TYPES)
     def link(self, pkg):
         pkg = self.parse_pkg_src(pkg)
-        pkg_dir = self.get_package_directory(pkg)
+        pkg_dir = self._get_package_directory_raw(pkg)
         unlink_dir = pkg_dir / 'unlink'
-        if os.path.exists(unlink_dir):
+        if unlink_dir.exists():
             util.mkdir(pkg_dir)
             os.rename(unlink_dir, pkg_dir)
             if util.USE_SYMLINKS:
@@ -473,21 +689,20 @@ class CGetPrefix:
             else:
                 util.copy_dir(pkg_dir / 'install', self.prefix)
         # Relink dependencies
+        fname = pkg.to_fname()
         for dep in util.ls(unlink_dir, os.path.isdir):
             ls = util.ls(self.get_unlink_deps_directory(pkg) / dep, os.path.isfile)
-            if pkg.to_fname() in ls: self.link(dep)
+            if fname in ls: self.link(dep)
 
     def _list_files(self, pkg=None, top=True):
-        pkg = self.parse_pkg_src(pkg)
-        pkg_dir = self.get_package_directory(pkg)
         if pkg is None:
-            return util.ls(pkg_dir, os.path.isdir)
+            return util.ls(self.get_private_path(), os.path.isdir)
+        fname = self.parse_pkg_src(pkg).to_fname()
+        ls = util.ls(self.get_deps_directory(fname), os.path.isfile)
+        if top:
+            return itertools.chain((fname,), ls)
         else:
-            ls = util.ls(self.get_deps_directory(pkg.to_fname()), os.path.isfile)
-            if top:
-                return [pkg.to_fname()] + list(ls)
-            else:
-                return ls
+            return ls
 
     def list(self, pkg=None, recursive=False, top=True):
         for d in self._list_files(pkg, top):
@@ -507,12 +722,14 @@ class CGetPrefix:
             for p in self.list():
                 self.remove(p)
             util.delete_dir(self.get_private_path())
+        self._clear_caches()
 
     def clean_cache(self):
         p = util.get_cache_path()
         if os.path.exists(p): shutil.rmtree(util.get_cache_path())
 
-    def pkg_config_path(self):
+    @util.cached_property
+    def pkg_config_path(self) -> str:
         paths = []
         for p in ['lib', 'lib64', 'share']:
             paths.append(str(self.prefix / p / 'pkgconfig'))
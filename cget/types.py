@@ -57,7 +57,8 @@ def require_type(obj, _type_, fname, name=None):
     return obj
 
 
-DEBUG = 'DEBUG' in os.environ and len(os.environ['DEBUG']) > 0
+# Type checks are never run under python -O
+DEBUG = __debug__ and 'DEBUG' in os.environ and len(os.environ['DEBUG']) > 0
 
 if DEBUG:
     @decorator_with_args
@@ -1,4 +1,4 @@
-import click, os, sys, shutil, json, six, hashlib, ssl, requests
+import click, os, sys, shutil, json, six, hashlib, ssl, requests, functools
 from rich.progress import (
     Progress, SpinnerColumn, DownloadColumn, TextColumn, FileSizeColumn,
     TotalFileSizeColumn, BarColumn, TransferSpeedColumn, TimeRemainingColumn)
@@ -47,10 +47,31 @@ def is_string(obj):
     return isinstance(obj, six.string_types)
 
 
+@functools.lru_cache(maxsize=128)
+def _quote_str(s):
+    return json.dumps(s)
+
+
 def quote(s):
     if not isinstance(s, str):
         s = str(s)
-    return json.dumps(s)
+    return _quote_str(s)
+
+
+class cached_property:
+    """Property computed on first access and then stored on the instance.
+
+    Stands in for functools.cached_property, which needs Python 3.8.
+    """
+    def __init__(self, func):
+        self.func = func
+        functools.update_wrapper(self, func)
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.func.__name__] = self.func(obj)
+        return value
 
 
 class ExtractProgress:
@@ -136,7 +157,7 @@ def ensure_exists(f):
     if not f:
         raise BuildError("Invalid file path")
     if not os.path.exists(f):
-        raise BuildError("File does not exists: " + f)
+        raise BuildError("File does not exists: " + str(f))
 
 
 def can(f):
@@ -168,7 +189,7 @@ def write_to(file, lines):
 
 
 def mkdir(p):
-    if not os.path.exists(p): os.makedirs(p)
+    os.makedirs(p, exist_ok=True)
     return p
 
 
@@ -1,6 +1,9 @@
 import os
 import shutil
 import textwrap
+import threading
+import time
+from pathlib import Path
 from unittest import mock
 
 import pytest
@@ -16,12 +19,32 @@ from cget.prefix import (
     parse_cmake_var_type,
     find_cmake,
     find_requirements_file,
+    split_tokens,
     CGetPrefix,
 )
 from cget.package import PackageSource, PackageBuild
 import cget.util as util
 
 
+# ── split_tokens ─────────────────────────────────────────────────────────────
+
+class TestSplitTokens:
+    def test_plain_words(self):
+        assert split_tokens("user/repo -DFOO=1\n") == ["user/repo", "-DFOO=1"]
+
+    def test_empty_line(self):
+        assert split_tokens("  \n") == []
+
+    def test_comment(self):
+        assert split_tokens("user/repo # comment\n") == ["user/repo"]
+
+    def test_quotes(self):
+        assert split_tokens('user/repo -DFOO="a b"') == ["user/repo", "-DFOO=a b"]
+
+    def test_escape(self):
+        assert split_tokens("a\\ b") == ["a b"]
+
+
 # ── parse_deprecated_alias ───────────────────────────────────────────────────
 
 class TestParseDeprecatedAlias:
@@ -100,35 +123,33 @@ class TestParseSrcName:
 
 class TestCmakeSet:
     def test_basic(self):
-        lines = list(cmake_set("VAR", "value"))
-        assert len(lines) == 1
-        assert 'set(VAR "value")' == lines[0]
+        line = cmake_set("VAR", "value")
+        assert 'set(VAR "value")' == line
 
     def test_no_quote(self):
-        lines = list(cmake_set("VAR", "value", quote=False))
-        assert 'set(VAR value)' == lines[0]
+        line = cmake_set("VAR", "value", quote=False)
+        assert 'set(VAR value)' == line
 
     def test_with_cache(self):
-        lines = list(cmake_set("VAR", "value", cache="STRING", description="A variable"))
-        assert 'CACHE STRING' in lines[0]
-        assert 'A variable' in lines[0]
+        line = cmake_set("VAR", "value", cache="STRING", description="A variable")
+        assert 'CACHE STRING' in line
+        assert 'A variable' in line
 
     def test_cache_none(self):
-        lines = list(cmake_set("VAR", "value", cache="none"))
-        assert 'CACHE' not in lines[0]
+        line = cmake_set("VAR", "value", cache="none")
+        assert 'CACHE' not in line
 
 
 # ── cmake_append ─────────────────────────────────────────────────────────────
 
 class TestCmakeAppend:
     def test_basic(self):
-        lines = list(cmake_append("VAR", "a", "b"))
-        assert len(lines) == 1
-        assert 'list(APPEND VAR "a" "b")' == lines[0]
+        line = cmake_append("VAR", "a", "b")
+        assert 'list(APPEND VAR "a" "b")' == line
 
     def test_no_quote(self):
-        lines = list(cmake_append("VAR", "a", "b", quote=False))
-        assert 'list(APPEND VAR a b)' == lines[0]
+        line = cmake_append("VAR", "a", "b", quote=False)
+        assert 'list(APPEND VAR a b)' == line
 
 
 # ── cmake_if / cmake_else ───────────────────────────────────────────────────
@@ -140,6 +161,9 @@ class TestCmakeIf:
         assert "    set(A B)" in lines
         assert lines[-1] == "endif()"
 
+    def test_single_line_body(self):
+        assert cmake_if("FOO", "set(A B)") == ["if (FOO)", "    set(A B)", "endif()"]
+
     def test_with_else(self):
         lines = list(cmake_if("FOO",
             ["set(A B)"],
@@ -214,6 +238,19 @@ class TestFindCmake:
         # Should either return a cget cmake path or the original
         assert result is not None
 
+    def test_builtin_name(self, tmp_path):
+        result = find_cmake("header", str(tmp_path))
+        assert result == util.cget_dir("cmake", "header.cmake")
+
+    def test_builtin_file_name(self, tmp_path):
+        result = find_cmake("header.cmake", str(tmp_path))
+        assert result == util.cget_dir("cmake", "header.cmake")
+
+    def test_local_file_shadows_builtin(self, tmp_path):
+        cmake_file = tmp_path / "header.cmake"
+        cmake_file.write_text("# cmake")
+        assert find_cmake("header.cmake", str(tmp_path)) == str(cmake_file)
+
     def test_empty_string(self):
         assert find_cmake("", "/start") == ""
 
@@ -285,21 +322,28 @@ class TestCGetPrefix:
         result = p.get_unlink_deps_directory("mypkg")
         assert result == os.path.join(p.prefix, "cget", "unlink", "mypkg", "deps")
 
-    def test_get_env(self, tmp_path):
+    def test_env(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
-        env = p.get_env()
+        env = p.env
         assert 'LD_LIBRARY_PATH' in env
         assert 'PKG_CONFIG_PATH' in env
-        assert env['LD_LIBRARY_PATH'] == p.get_path('lib')
+        assert env['LD_LIBRARY_PATH'] == str(p.prefix / 'lib')
 
     def test_pkg_config_path(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
-        result = p.pkg_config_path()
+        result = p.pkg_config_path
         assert "lib" in result
         assert "lib64" in result
         assert "share" in result
         assert "pkgconfig" in result
 
+    def test_cmd_created_on_first_access(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"), verbose=True)
+        assert 'cmd' not in p.__dict__
+        assert p.cmd is p.cmd
+        assert p.cmd.verbose
+        assert p.cmd.env == p.env
+
 
 # ── CGetPrefix.log ───────────────────────────────────────────────────────────
 
@@ -425,6 +469,33 @@ class TestWriteCmake:
         assert os.path.exists(toolchain)
         assert toolchain.endswith("cget.cmake")
 
+    def test_toolchain_written_on_first_access(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        assert not (p.get_private_path() / "cget.cmake").exists()
+        assert p.toolchain.exists()
+        assert p.toolchain == p.get_private_path() / "cget.cmake"
+
+    def test_same_content_not_rewritten(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        toolchain = p.write_cmake(always_write=True)
+        os.utime(toolchain, (0, 0))
+        p.write_cmake(always_write=True)
+        assert os.path.getmtime(toolchain) == 0
+
+    def test_changed_content_rewritten(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        toolchain = p.write_cmake(always_write=True)
+        os.utime(toolchain, (0, 0))
+        p.write_cmake(always_write=True, cc="/usr/bin/gcc")
+        assert os.path.getmtime(toolchain) != 0
+        assert "/usr/bin/gcc" in toolchain.read_text()
+
+    def test_existing_file_kept(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        toolchain = p.write_cmake(always_write=True, cc="/usr/bin/gcc")
+        p.write_cmake()
+        assert "/usr/bin/gcc" in toolchain.read_text()
+
 
 # ── CGetPrefix.generate_cmake_toolchain ──────────────────────────────────────
 
@@ -511,6 +582,26 @@ class TestGenerateCmakeToolchain:
         content = "\n".join(lines)
         assert "CMAKE_INSTALL_RPATH" in content
 
+    def test_cached_per_arguments(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        with mock.patch.object(p, '_generate_cmake_toolchain', wraps=p._generate_cmake_toolchain) as gen:
+            first = p.generate_cmake_toolchain(cflags="-O2", defines={"A": "1", "B": "2"})
+            second = p.generate_cmake_toolchain(cflags="-O2", defines={"A": "1", "B": "2"})
+            p.generate_cmake_toolchain(cflags="-O3")
+        assert first == second
+        assert gen.call_count == 2
+
+    def test_cached_keeps_defines_order(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        p.generate_cmake_toolchain(defines={"A": "1", "B": "2"})
+        lines = p.generate_cmake_toolchain(defines={"B": "2", "A": "1"})
+        assert lines == CGetPrefix(str(tmp_path / "pfx"))._generate_cmake_toolchain(defines={"B": "2", "A": "1"})
+
+    def test_cached_result_not_shared(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        p.generate_cmake_toolchain().append("junk")
+        assert "junk" not in p.generate_cmake_toolchain()
+
 
 # ── CGetPrefix.from_file ────────────────────────────────────────────────────
 
@@ -718,6 +809,21 @@ class TestParseDeprecatedAliasAdditional:
         assert name is None
         assert url == "simple"
 
+    def test_colon_alias_with_url(self):
+        name, url = parse_deprecated_alias("myalias:https://example.com")
+        assert name == "myalias"
+        assert url == "https://example.com"
+
+    def test_colon_alias_with_windows_path(self):
+        name, url = parse_deprecated_alias("myalias:C:\\path\\to\\pkg")
+        assert name == "myalias"
+        assert url == "C:\\path\\to\\pkg"
+
+    def test_trailing_colon(self):
+        name, url = parse_deprecated_alias("simple:")
+        assert name is None
+        assert url == "simple:"
+
 
 # ── parse_alias (additional) ─────────────────────────────────────────────────
 
@@ -748,31 +854,32 @@ class TestParseSrcNameAdditional:
         assert v is None
 
     def test_triple_same_name(self):
-        # functools.reduce only reduces if consecutive pairs are equal
-        # For "x/x/x": reduce(lambda x,y: x==y, ["x","x","x"]) = (True == "x") = False
-        # So no reduction happens
         p, v = parse_src_name("x/x/x")
-        assert p == "x/x/x"
+        assert p == "x"
+
+    def test_triple_different_name(self):
+        p, v = parse_src_name("x/x/y")
+        assert p == "x/x/y"
 
 
 # ── cmake_set (additional) ──────────────────────────────────────────────────
 
 class TestCmakeSetAdditional:
     def test_cache_bool(self):
-        lines = list(cmake_set("FLAG", "ON", cache="BOOL"))
-        assert 'CACHE BOOL' in lines[0]
+        line = cmake_set("FLAG", "ON", cache="BOOL")
+        assert 'CACHE BOOL' in line
 
     def test_with_no_description(self):
-        lines = list(cmake_set("VAR", "val", cache="STRING"))
-        assert 'CACHE STRING ""' in lines[0]
+        line = cmake_set("VAR", "val", cache="STRING")
+        assert 'CACHE STRING ""' in line
 
 
 # ── cmake_append (additional) ───────────────────────────────────────────────
 
 class TestCmakeAppendAdditional:
     def test_single_value(self):
-        lines = list(cmake_append("VAR", "a"))
-        assert 'list(APPEND VAR "a")' == lines[0]
+        line = cmake_append("VAR", "a")
+        assert 'list(APPEND VAR "a")' == line
 
 
 # ── cmake_if (additional) ───────────────────────────────────────────────────
@@ -922,6 +1029,29 @@ class TestParsePkgSrc:
         assert result.recipe is None
         assert "github.com" in result.url
 
+    def test_string_is_cached(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        with mock.patch.object(p, 'parse_src_file', wraps=p.parse_src_file) as mock_parse:
+            first = p.parse_pkg_src("user/repo")
+            second = p.parse_pkg_src("user/repo")
+        assert mock_parse.call_count == 1
+        assert first is not second
+        assert first.url == second.url
+
+    def test_recipe_found_after_cache_cleared(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        assert p.parse_pkg_src("zlib").recipe is None
+        recipe_path = os.path.join(p.get_recipe_paths()[0], "zlib")
+        os.makedirs(recipe_path)
+        assert p.parse_pkg_src("zlib").recipe is None
+        p._clear_caches()
+        assert p.parse_pkg_src("zlib").recipe is not None
+
+    def test_cached_copy_not_shared(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        p.parse_pkg_src("user/repo").name = "renamed"
+        assert p.parse_pkg_src("user/repo").name == "user/repo"
+
 
 # ── CGetPrefix.parse_pkg_build ──────────────────────────────────────────────
 
@@ -978,6 +1108,32 @@ class TestFromRecipe:
         assert isinstance(result, PackageBuild)
         assert result.pkg_src.name == "myname"
 
+    def test_recipe_is_cached(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        recipe = str(tmp_path / "recipe")
+        os.makedirs(recipe)
+        with open(os.path.join(recipe, "package.txt"), 'w') as f:
+            f.write("user/repo\n")
+        with mock.patch.object(p, 'from_file', wraps=p.from_file) as mock_from_file:
+            first = p.from_recipe(recipe, name="first")
+            second = p.from_recipe(recipe, name="second")
+        assert mock_from_file.call_count == 1
+        assert first.pkg_src.name == "first"
+        assert second.pkg_src.name == "second"
+
+    def test_recipe_reparsed_when_modified(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        recipe = str(tmp_path / "recipe")
+        os.makedirs(recipe)
+        package_txt = os.path.join(recipe, "package.txt")
+        with open(package_txt, 'w') as f:
+            f.write("user/repo\n")
+        os.utime(package_txt, (0, 0))
+        assert "user/repo" in p.from_recipe(recipe).pkg_src.url
+        with open(package_txt, 'w') as f:
+            f.write("other/repo\n")
+        assert "other/repo" in p.from_recipe(recipe).pkg_src.url
+
     def test_recipe_with_requirements(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
         recipe = str(tmp_path / "recipe")
@@ -988,7 +1144,7 @@ class TestFromRecipe:
         with open(req, 'w') as f:
             f.write("dep/lib\n")
         result = p.from_recipe(recipe)
-        assert result.requirements == req
+        assert result.requirements == Path(req)
 
     def test_recipe_missing_package_txt(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1191,6 +1347,11 @@ class TestUnlinkLink:
         assert os.path.exists(p.get_package_directory(pkg_name))
         assert not os.path.exists(p.get_unlink_directory(pkg_name))
 
+    def test_link_not_unlinked_no_error(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        p.link(PackageSource(name="mypkg", fname="mypkg"))
+        assert not os.path.exists(p.get_package_directory("mypkg"))
+
     def test_unlink_nonexistent_no_error(self, tmp_path, monkeypatch):
         monkeypatch.setattr(util, 'USE_SYMLINKS', False)
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1294,6 +1455,24 @@ class TestInstall:
         result = p.install(PackageBuild(pkg_src=ps))
         assert "already installed" in result
 
+    def test_install_already_installed_no_reparse(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        ps = PackageSource(name="mypkg", url="https://github.com/user/repo/archive/HEAD.tar.gz")
+        os.makedirs(p.get_private_path() / "mypkg")
+        with mock.patch.object(p, 'parse_pkg_build') as mock_parse:
+            result = p.install(PackageBuild(pkg_src=ps))
+        assert "already installed" in result
+        mock_parse.assert_not_called()
+
+    def test_install_already_installed_skips_recipe(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        os.makedirs(os.path.join(p.get_recipe_paths()[0], "mypkg"))
+        os.makedirs(p.get_private_path() / "mypkg")
+        with mock.patch.object(p, 'from_recipe') as mock_recipe:
+            result = p.install(PackageBuild(pkg_src="mypkg"))
+        assert "already installed" in result
+        mock_recipe.assert_not_called()
+
     def test_install_relinks_unlinked(self, tmp_path, monkeypatch):
         monkeypatch.setattr(util, 'USE_SYMLINKS', False)
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1333,6 +1512,156 @@ class TestInstall:
                 assert not os.path.exists(unlink_dir)
 
 
+# ── CGetPrefix.install (planning) ───────────────────────────────────────────
+
+class TestInstallPlan:
+    def _setup(self, tmp_path, events, fail=None, packages=None):
+        for name, requires in (packages or {"app": ["lib"], "lib": []}).items():
+            src = tmp_path / "src" / name / "src"
+            src.mkdir(parents=True)
+            (src / "requirements.cget").write_text(
+                "".join("{0},https://example.com/{0}.tar.gz\n".format(r) for r in requires))
+
+        def fetch(builder, url, *args, **kwargs):
+            name = url.split('/')[-1].split('.')[0]
+            events.append(("fetch", name))
+            return str(tmp_path / "src" / name / "src")
+
+        def build(builder, target=None, **kwargs):
+            if target == 'install':
+                events.append(("install", builder.top_dir.name))
+                if builder.top_dir.name == fail:
+                    raise util.BuildError("failed")
+
+        return fetch, build
+
+    def _install(self, p, fetch, build, jobs=1):
+        # Runs in a thread so a hang fails the test instead of blocking it
+        results = []
+
+        def install():
+            try:
+                with mock.patch('cget.builder.Builder.fetch', autospec=True, side_effect=fetch):
+                    with mock.patch('cget.builder.Builder.configure'):
+                        with mock.patch('cget.builder.Builder.build', autospec=True, side_effect=build):
+                            results.append(p.install(
+                                PackageBuild(PackageSource(name="app", url="https://example.com/app.tar.gz")),
+                                jobs=jobs))
+            except Exception as e:
+                results.append(e)
+
+        t = threading.Thread(target=install, daemon=True)
+        t.start()
+        t.join(30)
+        assert not t.is_alive()
+        if isinstance(results[0], Exception):
+            raise results[0]
+        return results[0]
+
+    def test_fetch_all_then_build_dependencies_first(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        events = []
+        fetch, build = self._setup(tmp_path, events)
+        assert "Successfully installed" in self._install(p, fetch, build)
+        assert events == [("fetch", "app"), ("fetch", "lib"), ("install", "lib"), ("install", "app")]
+
+    def test_dependency_records_parent(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        fetch, build = self._setup(tmp_path, [])
+        self._install(p, fetch, build)
+        assert (p.get_private_path() / "lib" / ".depend" / "app").is_file()
+
+    @pytest.mark.parametrize("jobs", [1, 4])
+    def test_dependency_cycle(self, tmp_path, jobs):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        events = []
+        fetch, build = self._setup(tmp_path, events, packages={"app": ["lib"], "lib": ["app"]})
+        assert "Successfully installed" in self._install(p, fetch, build, jobs)
+        assert events == [("fetch", "app"), ("fetch", "lib"), ("install", "lib"), ("install", "app")]
+
+    def test_shared_dependency_with_jobs(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        events = []
+        fetch, build = self._setup(tmp_path, events, packages={"app": ["a", "b"], "a": ["lib"], "b": ["lib"],
+                                                               "lib": []})
+        assert "Successfully installed" in self._install(p, fetch, build, 4)
+        fetched = [name for event, name in events if event == "fetch"]
+        assert sorted(fetched) == ["a", "app", "b", "lib"]
+        assert [e for e in events if e[0] == "install"] == [("install", "lib"), ("install", "a"), ("install", "b"),
+                                                            ("install", "app")]
+        assert sorted(os.listdir(p.get_private_path() / "lib" / ".depend")) == ["a", "b"]
+
+    def test_fetches_bounded_by_jobs(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        packages = {"app": ["a0", "a1", "a2"]}
+        for i in range(3):
+            packages["a%d" % i] = ["b%d%d" % (i, j) for j in range(3)]
+            for j in range(3):
+                packages["b%d%d" % (i, j)] = ["c%d%d%d" % (i, j, k) for k in range(3)]
+                for k in range(3):
+                    packages["c%d%d%d" % (i, j, k)] = []
+        fetch, build = self._setup(tmp_path, [], packages=packages)
+        lock = threading.Lock()
+        running = [0]
+        most = [0]
+
+        def slow_fetch(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return fetch(*args, **kwargs)
+
+        assert "Successfully installed" in self._install(p, slow_fetch, build, 3)
+        assert 1 < most[0] <= 3
+
+    def test_failed_fetch_with_jobs(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        events = []
+        fetch, build = self._setup(tmp_path, events, packages={"app": ["a", "b", "c"], "a": [], "b": [], "c": []})
+
+        def failing_fetch(builder, url, *args, **kwargs):
+            if "/b." in url:
+                raise util.BuildError("failed")
+            return fetch(builder, url, *args, **kwargs)
+
+        with pytest.raises(util.BuildError):
+            self._install(p, failing_fetch, build, 4)
+        assert not [e for e in events if e[0] == "install"]
+        assert list(util.ls(p.get_private_path())) == []
+
+    def test_replan_after_recipes_installed(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        events = []
+        fetch, build = self._setup(tmp_path, events, packages={"app": [], "recipes": [], "zlib": [], "HEAD": []})
+        (tmp_path / "src" / "app" / "src" / "requirements.cget").write_text(
+            "recipes,https://example.com/recipes.tar.gz\nzlib\n")
+
+        def install_recipes(builder, target=None, **kwargs):
+            build(builder, target=target, **kwargs)
+            if target == 'install' and builder.top_dir.name == "recipes":
+                util.mkfile(p.get_recipe_paths()[0] / "zlib", "package.txt", ["https://example.com/zlib.tar.gz"])
+
+        assert "Successfully installed" in self._install(p, fetch, install_recipes)
+        # zlib is first resolved from GitHub, then from the recipe once it's installed
+        assert events == [("fetch", "app"), ("fetch", "recipes"), ("fetch", "HEAD"), ("install", "recipes"),
+                          ("fetch", "app"), ("fetch", "zlib"), ("install", "zlib"), ("install", "app")]
+        assert sorted(os.listdir(p.get_private_path())) == ["recipes", "zlib"]
+        assert (p.get_private_path() / "zlib" / ".depend" / "app").is_file()
+
+    def test_failed_build_removes_unbuilt_packages(self, tmp_path):
+        p = CGetPrefix(str(tmp_path / "pfx"))
+        events = []
+        fetch, build = self._setup(tmp_path, events, fail="lib")
+        with pytest.raises(util.BuildError):
+            self._install(p, fetch, build)
+        assert ("install", "app") not in events
+        assert not (p.get_private_path() / "app").exists()
+        assert not (p.get_private_path() / "lib").exists()
+
+
 # ── CGetPrefix.install_deps ─────────────────────────────────────────────────
 
 class TestInstallDeps:
@@ -1444,7 +1773,7 @@ class TestPrefixBuild:
             with mock.patch('cget.builder.Builder.configure'):
                 with mock.patch('cget.builder.Builder.build'):
                     p.build(pb)
-                    assert pb.requirements == str(dev_req)
+                    assert pb.requirements == dev_req
 
     def test_build_with_regular_requirements(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1458,7 +1787,7 @@ class TestPrefixBuild:
             with mock.patch('cget.builder.Builder.configure'):
                 with mock.patch('cget.builder.Builder.build'):
                     p.build(pb)
-                    assert pb.requirements == str(req)
+                    assert pb.requirements == req
 
     def test_build_existing_skips_configure(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1571,12 +1900,12 @@ class TestFindRequirementsFile:
         (tmp_path / "requirements.cget").write_text("pkg\n")
         (tmp_path / "requirements.txt").write_text("pkg\n")
         result = find_requirements_file(str(tmp_path))
-        assert result.endswith("requirements.cget")
+        assert result.name == "requirements.cget"
 
     def test_falls_back_to_txt(self, tmp_path):
         (tmp_path / "requirements.txt").write_text("pkg\n")
         result = find_requirements_file(str(tmp_path))
-        assert result.endswith("requirements.txt")
+        assert result.name == "requirements.txt"
 
     def test_returns_none_when_missing(self, tmp_path):
         result = find_requirements_file(str(tmp_path))
@@ -1585,12 +1914,12 @@ class TestFindRequirementsFile:
     def test_dev_requirements_cget(self, tmp_path):
         (tmp_path / "dev-requirements.cget").write_text("pkg\n")
         result = find_requirements_file(str(tmp_path), 'dev-requirements')
-        assert result.endswith("dev-requirements.cget")
+        assert result.name == "dev-requirements.cget"
 
     def test_dev_requirements_txt_fallback(self, tmp_path):
         (tmp_path / "dev-requirements.txt").write_text("pkg\n")
         result = find_requirements_file(str(tmp_path), 'dev-requirements')
-        assert result.endswith("dev-requirements.txt")
+        assert result.name == "dev-requirements.txt"
 
     def test_txt_fallback_warns(self, tmp_path, capsys):
         (tmp_path / "requirements.txt").write_text("pkg\n")
@@ -1636,7 +1965,7 @@ class TestRequirementsTxtBackwardsCompat:
             with mock.patch('cget.builder.Builder.configure'):
                 with mock.patch('cget.builder.Builder.build'):
                     p.build(pb)
-                    assert pb.requirements == str(dev_req)
+                    assert pb.requirements == dev_req
 
     def test_build_with_requirements_txt_fallback(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1650,7 +1979,7 @@ class TestRequirementsTxtBackwardsCompat:
             with mock.patch('cget.builder.Builder.configure'):
                 with mock.patch('cget.builder.Builder.build'):
                     p.build(pb)
-                    assert pb.requirements == str(req)
+                    assert pb.requirements == req
 
     def test_recipe_with_requirements_txt_fallback(self, tmp_path):
         p = CGetPrefix(str(tmp_path / "pfx"))
@@ -1662,4 +1991,4 @@ class TestRequirementsTxtBackwardsCompat:
         with open(req, 'w') as f:
             f.write("dep/lib\n")
         result = p.from_recipe(recipe)
-        assert result.requirements == req
+        assert result.requirements == Path(req)
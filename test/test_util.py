@@ -6,6 +6,7 @@ import hashlib
 import tarfile
 import tempfile
 import zipfile
+from pathlib import Path
 from unittest import mock
 
 import pytest
@@ -72,6 +73,40 @@ class TestQuote:
     def test_path_with_backslashes(self):
         assert util.quote("C:\\path\\to") == json.dumps("C:\\path\\to")
 
+    def test_non_string(self):
+        assert util.quote(Path("/usr/lib")) == json.dumps("/usr/lib")
+        assert util.quote(42) == '"42"'
+
+
+# ── cached_property ──────────────────────────────────────────────────────────
+
+class TestCachedProperty:
+    def test_computed_once(self):
+        calls = []
+
+        class C:
+            @util.cached_property
+            def value(self):
+                calls.append(1)
+                return 42
+
+        c = C()
+        assert 'value' not in c.__dict__
+        assert c.value == 42
+        assert c.value == 42
+        assert len(calls) == 1
+        assert c.__dict__['value'] == 42
+
+    def test_class_access(self):
+        class C:
+            @util.cached_property
+            def value(self):
+                "The value."
+                return 42
+
+        assert isinstance(C.value, util.cached_property)
+        assert C.value.__doc__ == "The value."
+
 
 # ── BuildError ───────────────────────────────────────────────────────────────
 